@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from numba import njit
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def psi_kernel(ref: np.ndarray, tgt: np.ndarray, lo: float, hi: float, bins: int) -> float:
+    """Population Stability Index over equal-width bins spanning [lo, hi] with open outer bins"""
+    ref_counts = np.zeros(bins)
+    tgt_counts = np.zeros(bins)
+
+    # A constant reference column collapses every edge onto lo
+    inv = bins / (hi - lo) if hi > lo else 0.0
+
+    for v in ref:
+        if inv > 0.0:
+            i = min(bins - 1, max(0, int((v - lo) * inv)))
+        else:
+            i = bins - 1 if v >= lo else 0
+        ref_counts[i] += 1
+
+    for v in tgt:
+        if inv > 0.0:
+            i = min(bins - 1, max(0, int((v - lo) * inv)))
+        else:
+            i = bins - 1 if v >= lo else 0
+        tgt_counts[i] += 1
+
+    # Normalize, add small constant to avoid division by zero and accumulate PSI
+    psi = 0.0
+    for i in range(bins):
+        r = ref_counts[i] / ref.size + 0.0001
+        t = tgt_counts[i] / tgt.size + 0.0001
+        psi += (t - r) * np.log(t / r)
+
+    return psi
+
+
+@njit(cache=True, fastmath=True, nogil=True)
+def mean_std_min_max(a: np.ndarray):
+    """Mean, sample standard deviation, min and max in a single Welford pass"""
+    n = a.size
+    m = 0.0
+    m2 = 0.0
+    lo = a[0]
+    hi = a[0]
+    for i in range(n):
+        v = a[i]
+        d = v - m
+        m += d / (i + 1)
+        m2 += d * (v - m)
+        if v < lo:
+            lo = v
+        if v > hi:
+            hi = v
+
+    std = (m2 / (n - 1)) ** 0.5 if n > 1 else np.nan
+    return m, std, lo, hi
+
+
+def value_counts(series: pd.Series) -> pd.Series:
+    """Non-null value counts by descending frequency, hashed by Arrow for object columns"""
+    if series.dtype != object:
+        return series.value_counts()
+
+    try:
+        arr = pa.Array.from_pandas(series)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Mixed Python types have no Arrow equivalent
+        return series.value_counts()
+
+    counts = pc.value_counts(arr.drop_null())
+    return pd.Series(
+        counts.field('counts').to_numpy(),
+        index=pd.Index(counts.field('values').to_pandas(), name=series.name),
+        name='count'
+    ).sort_values(ascending=False, kind='stable')
+
+
+# Compile at import so the first request does not pay the JIT latency
+_warmup = np.arange(4, dtype=np.float64)
+psi_kernel(_warmup, _warmup, 0.0, 3.0, 2)
+mean_std_min_max(_warmup)
+del _warmup
@@ -1,38 +1,84 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from scipy import stats
+from _kernels import mean_std_min_max, psi_kernel, value_counts
 
 logger = logging.getLogger(__name__)
 
 class DriftDetector:
-    def __init__(self, threshold: float = 0.05):
-        """Initialize drift detector with significance threshold"""
+    def __init__(self, threshold: float = 0.05, max_samples: int = 50_000, n_batches: int = 5):
+        """Initialize drift detector with significance threshold and KS sampling limits"""
         self.threshold = threshold
+        self.max_samples = max_samples
+        self.n_batches = n_batches
+        
+        # Seed source for permutation tests; child generators are spawned per worker
+        self._rng = np.random.default_rng()
+        self._rng_lock = threading.Lock()
     
-    def detect_drift(self, reference_df: pd.DataFrame, target_df: pd.DataFrame) -> Dict[str, Any]:
-        """Detect drift between reference and target datasets"""
+    def detect_drift(self, reference_df: pd.DataFrame, target_df: pd.DataFrame,
+                     reference_sketch: Optional[Dict[str, Any]] = None,
+                     target_sketch: Optional[Dict[str, Any]] = None,
+                     n_permutations: int = 0) -> Dict[str, Any]:
+        """Detect drift between reference and target datasets, using stored column sketches when available
+        
+        With n_permutations > 0, numeric columns also get a permutation-test KS p-value.
+        """
         try:
             column_drift = {}
-            drift_scores = []
             
-            # Get common columns
-            common_cols = list(set(reference_df.columns) & set(target_df.columns))
+            # Get common columns and split them by type once
+            common_cols = reference_df.columns.intersection(target_df.columns)
+            numeric_types = [np.number, 'bool']
+            ref_numeric = reference_df[common_cols].select_dtypes(include=numeric_types).columns
+            target_numeric = target_df[common_cols].select_dtypes(include=numeric_types).columns
             
-            for column in common_cols:
-                # Determine column type
-                is_numeric = pd.api.types.is_numeric_dtype(reference_df[column])
+            num_cols = ref_numeric.intersection(target_numeric)
+            cat_cols = common_cols.difference(num_cols)
+            
+            # Columns whose sketches show no movement skip the full tests
+            if reference_sketch and target_sketch:
+                for column in common_cols:
+                    if column in reference_sketch and column in target_sketch:
+                        sketch_result = self._sketch_test(column, reference_sketch[column], target_sketch[column])
+                        if sketch_result is not None:
+                            column_drift[column] = sketch_result
+                num_cols = num_cols[~num_cols.isin(list(column_drift))]
+                cat_cols = cat_cols[~cat_cols.isin(list(column_drift))]
+            
+            # Tests run in threads; numpy, scipy and the numba kernels release the GIL
+            max_workers = os.cpu_count() or 1
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                # Numerical columns - use KS test, vectorized within each column chunk
+                ks_futures = []
+                if len(num_cols) > 0:
+                    chunks = np.array_split(np.arange(len(num_cols)), min(max_workers, len(num_cols)))
+                    with self._rng_lock:
+                        chunk_rngs = self._rng.spawn(len(chunks))
+                    ks_futures = [
+                        executor.submit(
+                            self._ks_test, reference_df, target_df, num_cols[chunk], n_permutations, rng
+                        )
+                        for chunk, rng in zip(chunks, chunk_rngs)
+                    ]
                 
-                if is_numeric:
-                    # Numerical column - use KS test
-                    drift_result = self._ks_test(reference_df, target_df, column)
-                else:
-                    # Categorical column - use Chi-square test
-                    drift_result = self._chi_square_test(reference_df, target_df, column)
+                # Categorical columns - use Chi-square test
+                chi_square_futures = {
+                    column: executor.submit(self._chi_square_test, reference_df, target_df, column)
+                    for column in cat_cols
+                }
                 
-                column_drift[column] = drift_result
-                drift_scores.append(drift_result['drift_score'])
+                for future in ks_futures:
+                    column_drift.update(future.result())
+                for column, future in chi_square_futures.items():
+                    column_drift[column] = future.result()
+            
+            drift_scores = [d['drift_score'] for d in column_drift.values()]
             
             # Calculate overall drift score (average of column drift scores)
             overall_drift_score = np.mean(drift_scores) if drift_scores else 0.0
@@ -57,58 +103,218 @@ class DriftDetector:
                 'test_results': {'error': str(e)}
             }
     
-    def _ks_test(self, ref_df: pd.DataFrame, target_df: pd.DataFrame, column: str) -> Dict[str, Any]:
-        """Kolmogorov-Smirnov test for numerical columns"""
-        try:
-            # Get data
-            ref_data = ref_df[column].dropna()
-            target_data = target_df[column].dropna()
+    def _sketch_test(self, column: str, ref_sketch: Dict[str, Any], target_sketch: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Drift result from stored sketches, or None if the column needs the full test"""
+        if 'q' in ref_sketch and 'q' in target_sketch:
+            ref_q = np.asarray(ref_sketch['q'], dtype=np.float64)
+            target_q = np.asarray(target_sketch['q'], dtype=np.float64)
+            if ref_q.shape != target_q.shape:
+                return None
             
-            # Perform KS test
-            ks_statistic, p_value = stats.ks_2samp(ref_data, target_data)
+            # Approximate KS statistic by comparing the two quantile functions on the same grid
+            levels = np.linspace(0, 1, len(ref_q))
+            ks_estimate = max(
+                np.max(np.abs(levels - np.interp(ref_q, target_q, levels))),
+                np.max(np.abs(levels - np.interp(target_q, ref_q, levels)))
+            )
             
-            has_drift = p_value < self.threshold
-            
-            # Calculate PSI (Population Stability Index)
-            psi_score = self._calculate_psi(ref_data, target_data)
+            # Skip only when the estimate plus the grid resolution stays under the
+            # asymptotic KS critical value for the stored sample sizes
+            n, m = ref_sketch['n'], target_sketch['n']
+            if n == 0 or m == 0:
+                return None
+            critical_value = np.sqrt(-0.5 * np.log(self.threshold / 2) * (n + m) / (n * m))
+            if ks_estimate + 1 / (len(ref_q) - 1) >= critical_value:
+                return None
             
             return {
                 'column_name': column,
-                'test_type': 'KS Test',
-                'has_drift': bool(has_drift),
-                'drift_score': float(ks_statistic),
-                'p_value': float(p_value),
-                'psi_score': float(psi_score),
-                'reference_mean': float(ref_data.mean()),
-                'target_mean': float(target_data.mean()),
-                'reference_std': float(ref_data.std()),
-                'target_std': float(target_data.std())
-            }
-        except Exception as e:
-            logger.error(f"Error in KS test for column {column}: {str(e)}")
-            return {
-                'column_name': column,
-                'test_type': 'KS Test',
+                'test_type': 'KS Test (sketch)',
                 'has_drift': False,
-                'drift_score': 0.0,
-                'error': str(e)
+                'drift_score': float(ks_estimate),
+                'critical_value': float(critical_value)
             }
+        
+        # Identical complete value counts mean identical categorical distributions
+        if 'topk' in ref_sketch and 'topk' in target_sketch:
+            ref_topk = ref_sketch['topk']
+            if ref_topk == target_sketch['topk'] and sum(ref_topk.values()) == ref_sketch['n'] == target_sketch['n']:
+                return {
+                    'column_name': column,
+                    'test_type': 'Chi-Square Test (sketch)',
+                    'has_drift': False,
+                    'drift_score': 0.0,
+                    'p_value': 1.0,
+                    'reference_unique_values': len(ref_topk),
+                    'target_unique_values': len(ref_topk)
+                }
+        
+        return None
+    
+    def _ks_test(self, ref_df: pd.DataFrame, target_df: pd.DataFrame, columns: pd.Index,
+                 n_permutations: int = 0, rng: Optional[np.random.Generator] = None) -> Dict[str, Dict[str, Any]]:
+        """Kolmogorov-Smirnov test for numerical columns, run as one vectorized call"""
+        try:
+            # Get data as aligned 2D arrays, one column per tested feature
+            ref_num = ref_df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+            target_num = target_df[columns].to_numpy(dtype=np.float64, na_value=np.nan)
+            
+            # Columns with no values on either side cannot be tested
+            testable = (~np.isnan(ref_num)).any(axis=0) & (~np.isnan(target_num)).any(axis=0)
+            results = {
+                column: self._ks_error(column, 'Data passed to ks_2samp must not be empty')
+                for column in columns[~testable]
+            }
+            if not testable.any():
+                return results
+            
+            ref_num = ref_num[:, testable]
+            target_num = target_num[:, testable]
+            
+            # Perform KS test for all columns at once
+            ks_statistics, p_values, ks_spread = self._batched_ks_2samp(ref_num, target_num)
+            
+            for i, (column, ks_statistic, p_value) in enumerate(zip(columns[testable], ks_statistics, p_values)):
+                ref_data = ref_num[:, i]
+                target_data = target_num[:, i]
+                results[column] = self._ks_result(
+                    column,
+                    ref_data[~np.isnan(ref_data)],
+                    target_data[~np.isnan(target_data)],
+                    ks_statistic,
+                    p_value
+                )
+                if ks_spread is not None:
+                    results[column]['drift_score_std'] = float(ks_spread[i])
+                if n_permutations > 0:
+                    results[column]['permutation_p_value'] = self._ks_permutation_pvalue(
+                        ref_data[~np.isnan(ref_data)],
+                        target_data[~np.isnan(target_data)],
+                        n_permutations,
+                        rng
+                    )
+            
+            return results
+        except Exception as e:
+            logger.error(f"Error in KS test for columns {list(columns)}: {str(e)}")
+            return {column: self._ks_error(column, str(e)) for column in columns}
+    
+    def _batched_ks_2samp(self, ref_num: np.ndarray, target_num: np.ndarray):
+        """KS statistics and p-values per column, averaged over disjoint row shards for large inputs"""
+        if max(len(ref_num), len(target_num)) <= self.max_samples:
+            ks_statistics, p_values = stats.ks_2samp(ref_num, target_num, axis=0, nan_policy='omit')
+            return ks_statistics, p_values, None
+        
+        # Deterministic sampling so repeated checks on the same data agree
+        rng = np.random.default_rng(0)
+        ref_shards = self._sample_shards(ref_num, rng)
+        target_shards = self._sample_shards(target_num, rng)
+        
+        batch_results = [
+            stats.ks_2samp(ref_shard, target_shard, axis=0, nan_policy='omit')
+            for ref_shard, target_shard in zip(ref_shards, target_shards)
+        ]
+        batch_statistics = np.array([r.statistic for r in batch_results])
+        batch_p_values = np.array([r.pvalue for r in batch_results])
+        
+        return (
+            np.nanmean(batch_statistics, axis=0),
+            np.nanmedian(batch_p_values, axis=0),
+            np.nanstd(batch_statistics, axis=0)
+        )
+    
+    def _ks_permutation_pvalue(self, ref: np.ndarray, target: np.ndarray, n_perm: int = 1000,
+                               rng: Optional[np.random.Generator] = None,
+                               max_elements: int = 10_000_000) -> float:
+        """Permutation-test p-value for the two-sample KS statistic"""
+        if rng is None:
+            rng = np.random.default_rng()
+        
+        # Cap each side like the batched KS test so the permutation matrix stays bounded
+        if len(ref) > self.max_samples:
+            ref = rng.choice(ref, self.max_samples, replace=False)
+        if len(target) > self.max_samples:
+            target = rng.choice(target, self.max_samples, replace=False)
+        
+        n_ref = len(ref)
+        combined = np.concatenate([ref, target])
+        observed = stats.ks_2samp(ref, target, method='asymp').statistic
+        
+        # Shuffle whole (rows, N) matrices at once, in chunks bounded by max_elements
+        rows_per_chunk = max(1, max_elements // len(combined))
+        exceed = 0
+        for start in range(0, n_perm, rows_per_chunk):
+            n_rows = min(rows_per_chunk, n_perm - start)
+            permuted = rng.permuted(np.broadcast_to(combined, (n_rows, len(combined))), axis=1)
+            permuted_statistics = stats.ks_2samp(
+                permuted[:, :n_ref], permuted[:, n_ref:], axis=1, method='asymp'
+            ).statistic
+            exceed += int(np.count_nonzero(permuted_statistics >= observed))
+        
+        return (exceed + 1) / (n_perm + 1)
+    
+    def _sample_shards(self, data: np.ndarray, rng: np.random.Generator) -> List[np.ndarray]:
+        """Split a random subsample of rows into n_batches disjoint shards of at most max_samples rows"""
+        if len(data) <= self.max_samples:
+            return [data] * self.n_batches
+        
+        sample_size = min(len(data), self.n_batches * self.max_samples)
+        rows = rng.choice(len(data), size=sample_size, replace=False)
+        return [data[np.sort(shard)] for shard in np.array_split(rows, self.n_batches)]
+    
+    def _ks_result(self, column: str, ref_data: np.ndarray, target_data: np.ndarray,
+                   ks_statistic: float, p_value: float) -> Dict[str, Any]:
+        """Build the KS test result for a single column"""
+        has_drift = p_value < self.threshold
+        
+        # Summary statistics in one pass over each side
+        ref_mean, ref_std, ref_min, ref_max = mean_std_min_max(ref_data)
+        target_mean, target_std, _, _ = mean_std_min_max(target_data)
+        
+        # Calculate PSI (Population Stability Index)
+        psi_score = self._calculate_psi(ref_data, target_data, value_range=(ref_min, ref_max))
+        
+        return {
+            'column_name': column,
+            'test_type': 'KS Test',
+            'has_drift': bool(has_drift),
+            'drift_score': float(ks_statistic),
+            'p_value': float(p_value),
+            'psi_score': float(psi_score),
+            'reference_mean': float(ref_mean),
+            'target_mean': float(target_mean),
+            'reference_std': float(ref_std),
+            'target_std': float(target_std)
+        }
+    
+    def _ks_error(self, column: str, error: str) -> Dict[str, Any]:
+        """KS test result for a column that could not be tested"""
+        return {
+            'column_name': column,
+            'test_type': 'KS Test',
+            'has_drift': False,
+            'drift_score': 0.0,
+            'error': error
+        }
     
     def _chi_square_test(self, ref_df: pd.DataFrame, target_df: pd.DataFrame, column: str) -> Dict[str, Any]:
         """Chi-square test for categorical columns"""
         try:
             # Get value counts
-            ref_counts = ref_df[column].value_counts().reset_index()
-            ref_counts.columns = [column, 'count_ref']
+            ref_counts = value_counts(ref_df[column])
+            target_counts = value_counts(target_df[column])
             
-            target_counts = target_df[column].value_counts().reset_index()
-            target_counts.columns = [column, 'count_target']
+            # Align both counts on the union of observed values
+            ref_aligned, target_aligned = ref_counts.align(target_counts, fill_value=0)
+            ref_arr = ref_aligned.to_numpy(dtype=np.float64)
+            target_arr = target_aligned.to_numpy(dtype=np.float64)
             
-            # Merge on column values
-            merged = pd.merge(ref_counts, target_counts, on=column, how='outer').fillna(0)
+            if ref_arr.sum() == 0 or target_arr.sum() == 0:
+                raise ValueError("Data passed to chi2_contingency must not be empty")
             
-            # Perform Chi-square test
-            chi2_statistic, p_value = stats.chisquare(merged['count_target'], merged['count_ref'])
+            # Test homogeneity of the 2 x k contingency table; expected frequencies come
+            # from the pooled counts, so values seen on only one side stay finite
+            chi2_statistic, p_value, _, _ = stats.chi2_contingency(np.vstack([ref_arr, target_arr]))
             
             has_drift = p_value < self.threshold
             
@@ -131,24 +337,20 @@ class DriftDetector:
                 'error': str(e)
             }
     
-    def _calculate_psi(self, ref_data: pd.Series, target_data: pd.Series, bins: int = 10) -> float:
+    def _calculate_psi(self, ref_data: np.ndarray, target_data: np.ndarray, bins: int = 10,
+                       value_range: Optional[Tuple[float, float]] = None) -> float:
         """Calculate Population Stability Index (PSI)"""
         try:
-            # Create bins based on reference data
-            breakpoints = np.linspace(ref_data.min(), ref_data.max(), bins + 1)
-            breakpoints[0] = -np.inf
-            breakpoints[-1] = np.inf
-            
-            # Calculate distribution for reference and target
-            ref_dist = np.histogram(ref_data, bins=breakpoints)[0] / len(ref_data)
-            target_dist = np.histogram(target_data, bins=breakpoints)[0] / len(target_data)
-            
-            # Add small constant to avoid division by zero
-            ref_dist = ref_dist + 0.0001
-            target_dist = target_dist + 0.0001
-            
-            # Calculate PSI
-            psi = np.sum((target_dist - ref_dist) * np.log(target_dist / ref_dist))
+            # Bins span the reference range with open-ended outer bins
+            if value_range is None:
+                value_range = (ref_data.min(), ref_data.max())
+            psi = psi_kernel(
+                np.ascontiguousarray(ref_data, dtype=np.float64),
+                np.ascontiguousarray(target_data, dtype=np.float64),
+                float(value_range[0]),
+                float(value_range[1]),
+                bins
+            )
             
             return psi
         except Exception as e:
@@ -1,7 +1,8 @@
 import pandas as pd
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import logging
+from _kernels import value_counts
 
 logger = logging.getLogger(__name__)
 
@@ -13,16 +14,20 @@ class DataQualityChecker:
         """Check for missing values in each column"""
         try:
             total_rows = len(df)
-            missing_info = {}
             
-            for column in df.columns:
-                missing_count = df[column].isna().sum()
-                missing_percentage = (missing_count / total_rows) * 100 if total_rows > 0 else 0
-                
-                missing_info[column] = {
+            # Count missing values for all columns in a single reduction
+            missing_counts = df.isna().sum(axis=0)
+            missing_percentages = (missing_counts / max(total_rows, 1)) * 100
+            
+            missing_info = {
+                column: {
                     'count': int(missing_count),
-                    'percentage': round(missing_percentage, 2)
+                    'percentage': round(float(missing_percentage), 2)
                 }
+                for column, missing_count, missing_percentage in zip(
+                    df.columns, missing_counts.to_numpy(), missing_percentages.to_numpy()
+                )
+            }
             
             return {
                 'total_rows': int(total_rows),
@@ -32,12 +37,15 @@ class DataQualityChecker:
             logger.error(f"Error checking missing values: {str(e)}")
             return {}
     
-    def check_duplicates(self, df: pd.DataFrame) -> Dict[str, Any]:
-        """Check for duplicate rows"""
+    def check_duplicates(self, df: pd.DataFrame, cached_duplicate_count: Optional[int] = None) -> Dict[str, Any]:
+        """Check for duplicate rows, reusing a count computed at upload when given"""
         try:
             total_rows = len(df)
-            unique_rows = len(df.drop_duplicates())
-            duplicate_count = total_rows - unique_rows
+            if cached_duplicate_count is not None:
+                duplicate_count = int(cached_duplicate_count)
+            else:
+                duplicate_count = int(df.duplicated().sum())
+            unique_rows = total_rows - duplicate_count
             
             return {
                 'total_rows': int(total_rows),
@@ -54,29 +62,40 @@ class DataQualityChecker:
         try:
             outliers_info = {}
             
-            # Get numeric columns
-            numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+            # Get numeric columns, skipping those with no values at all
+            numeric_df = df.select_dtypes(include=[np.number])
+            data = numeric_df.to_numpy(dtype=np.float64, na_value=np.nan)
+            valid_counts = np.sum(~np.isnan(data), axis=0)
+            has_values = valid_counts > 0
+            numeric_cols = numeric_df.columns[has_values]
+            data = data[:, has_values]
+            valid_counts = valid_counts[has_values]
             
-            for column in numeric_cols:
-                col_data = df[column].dropna()
-                
-                if len(col_data) > 0:
-                    Q1 = col_data.quantile(0.25)
-                    Q3 = col_data.quantile(0.75)
-                    IQR = Q3 - Q1
-                    
-                    lower_bound = Q1 - 1.5 * IQR
-                    upper_bound = Q3 + 1.5 * IQR
-                    
-                    outliers = col_data[(col_data < lower_bound) | (col_data > upper_bound)]
-                    outlier_count = len(outliers)
-                    
-                    outliers_info[column] = {
-                        'count': int(outlier_count),
-                        'percentage': round((outlier_count / len(col_data)) * 100, 2),
-                        'lower_bound': float(lower_bound),
-                        'upper_bound': float(upper_bound)
-                    }
+            if len(numeric_cols) == 0:
+                return outliers_info
+            
+            # Compute both quartiles for every column in one call
+            Q1, Q3 = np.nanquantile(data, [0.25, 0.75], axis=0)
+            IQR = Q3 - Q1
+            
+            lower_bounds = Q1 - 1.5 * IQR
+            upper_bounds = Q3 + 1.5 * IQR
+            
+            # One compare against the fence half-width instead of two compares and an OR;
+            # NaN compares False, so missing values are never outliers
+            centers = (upper_bounds + lower_bounds) * 0.5
+            half_widths = (upper_bounds - lower_bounds) * 0.5
+            outlier_counts = np.count_nonzero(np.abs(data - centers) > half_widths, axis=0)
+            
+            for column, outlier_count, valid_count, lower_bound, upper_bound in zip(
+                numeric_cols, outlier_counts, valid_counts, lower_bounds, upper_bounds
+            ):
+                outliers_info[column] = {
+                    'count': int(outlier_count),
+                    'percentage': round(float(outlier_count / valid_count) * 100, 2),
+                    'lower_bound': float(lower_bound),
+                    'upper_bound': float(upper_bound)
+                }
             
             return outliers_info
         except Exception as e:
@@ -91,7 +110,7 @@ class DataQualityChecker:
             logger.error(f"Error checking data types: {str(e)}")
             return {}
     
-    def get_statistics(self, df: pd.DataFrame) -> Dict[str, Any]:
+    def get_statistics(self, df: pd.DataFrame, include_quartiles: bool = False) -> Dict[str, Any]:
         """Get comprehensive statistics for the dataset"""
         try:
             stats = {}
@@ -100,12 +119,20 @@ class DataQualityChecker:
             numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
             
             if numeric_cols:
-                # Get summary statistics
-                summary = df[numeric_cols].describe()
-                stats['numeric_summary'] = summary.to_dict('records')
+                # Get summary statistics, one aggregation pass per statistic
+                summary = df[numeric_cols].agg(['count', 'mean', 'std', 'min', 'max']).to_dict()
+                
+                if include_quartiles:
+                    # All quartiles of all columns in one call
+                    data = df[numeric_cols].to_numpy(dtype=np.float64, na_value=np.nan)
+                    quartiles = np.nanquantile(data, [0.25, 0.5, 0.75], axis=0)
+                    for col_name, (q1, median, q3) in zip(numeric_cols, quartiles.T):
+                        summary[col_name].update({'25%': float(q1), '50%': float(median), '75%': float(q3)})
+                
+                stats['numeric_summary'] = summary
             
             # Get categorical columns
-            categorical_cols = df.select_dtypes(include=['object']).columns.tolist()
+            categorical_cols = df.select_dtypes(include=['object', 'category']).columns.tolist()
             
             stats['categorical_columns'] = categorical_cols
             stats['numeric_columns'] = numeric_cols
@@ -113,9 +140,9 @@ class DataQualityChecker:
             # Get value counts for categorical columns (limited to first 5 columns)
             stats['categorical_summary'] = {}
             for col_name in categorical_cols[:5]:
-                value_counts = df[col_name].value_counts().head(10).reset_index()
-                value_counts.columns = [col_name, 'count']
-                stats['categorical_summary'][col_name] = value_counts.to_dict('records')
+                top_counts = value_counts(df[col_name]).head(10).reset_index()
+                top_counts.columns = [col_name, 'count']
+                stats['categorical_summary'][col_name] = top_counts.to_dict('records')
             
             return stats
         except Exception as e:
@@ -1,17 +1,22 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, BackgroundTasks, Query
 from fastapi.responses import JSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorGridFSBucket
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
 from datetime import datetime, timezone
 import pandas as pd
 import io
+import asyncio
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import zstandard as zstd
+from cachetools import LRUCache
 from spark_processor import SparkDataProcessor
 from quality_checker import DataQualityChecker
 from drift_detector import DriftDetector
@@ -23,6 +28,7 @@ load_dotenv(ROOT_DIR / '.env')
 mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
+fs = AsyncIOMotorGridFSBucket(db)
 
 # Create the main app without a prefix
 # Set max upload size to 500MB (adjust as needed)
@@ -37,6 +43,181 @@ spark_processor = SparkDataProcessor()
 quality_checker = DataQualityChecker()
 drift_detector = DriftDetector()
 
+# Parsed DataFrames keyed by dataset id, so repeat checks skip deserialization
+df_cache = LRUCache(maxsize=16)
+
+# Payload fields embedded by older uploads; new uploads keep the data in GridFS
+EMBEDDED_DATA_FIELDS = ["csv_blob", "csv_data", "parquet_bytes"]
+
+# Excludes any embedded payload and the drift sketches when only dataset metadata is needed
+DATA_FIELDS_PROJECTION = {
+    "_id": 0,
+    "data_summary.sketch": 0,
+    **{field: 0 for field in EMBEDDED_DATA_FIELDS}
+}
+
+async def _load_df(dataset_id: str) -> Optional[pd.DataFrame]:
+    """Load a dataset as a DataFrame from the cache, GridFS, or a legacy embedded payload"""
+    df = df_cache.get(dataset_id)
+    if df is not None:
+        return df
+    
+    dataset_doc = await db.datasets.find_one(
+        {"id": dataset_id},
+        {
+            "_id": 0,
+            "blob_id": 1,
+            "blob_format": 1,
+            "arrow_blob_id": 1,
+            **{field: 1 for field in EMBEDDED_DATA_FIELDS}
+        }
+    )
+    if not dataset_doc:
+        return None
+    
+    # Older Arrow uploads recorded their GridFS file as arrow_blob_id
+    blob_id = dataset_doc.get('blob_id') or dataset_doc.get('arrow_blob_id')
+    blob_format = dataset_doc.get('blob_format', 'arrow')
+    csv_blob = dataset_doc.get('csv_blob')
+    parquet_bytes = dataset_doc.get('parquet_bytes')
+    
+    # Decode on a worker thread so the event loop keeps serving other requests
+    if blob_id:
+        grid_out = await fs.open_download_stream(blob_id)
+        reader = _read_csv_blob if blob_format == 'csv.zst' else _read_arrow_ipc
+        df = await asyncio.to_thread(reader, await grid_out.read())
+    elif parquet_bytes:
+        # Datasets uploaded before Arrow storage kept an embedded Parquet blob
+        df = await asyncio.to_thread(pd.read_parquet, io.BytesIO(parquet_bytes), engine='pyarrow')
+    elif csv_blob:
+        # Datasets uploaded before GridFS storage kept embedded zstd-compressed CSV
+        df = await asyncio.to_thread(_read_csv_blob, csv_blob)
+    else:
+        # Datasets uploaded before compressed storage only have the CSV string
+        df = await asyncio.to_thread(pd.read_csv, io.StringIO(dataset_doc.get('csv_data')))
+    
+    # Storage keeps the parsed types; the cached frame uses the compact ones
+    df = await asyncio.to_thread(spark_processor.optimize_dtypes, df)
+    
+    df_cache[dataset_id] = df
+    return df
+
+async def _load_summary_field(dataset_id: str, field: str) -> Any:
+    """Load a single field of a dataset's stored summary, or None if it is missing"""
+    dataset_doc = await db.datasets.find_one({"id": dataset_id}, {"_id": 0, f"data_summary.{field}": 1})
+    return ((dataset_doc or {}).get('data_summary') or {}).get(field)
+
+def _to_arrow_ipc(df: pd.DataFrame, table: Optional[pa.Table] = None) -> Optional[bytes]:
+    """Serialize a dataset to a zstd-compressed Arrow IPC stream, or None if it cannot be encoded"""
+    try:
+        if table is None:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        sink = pa.BufferOutputStream()
+        options = pa.ipc.IpcWriteOptions(compression='zstd')
+        with pa.ipc.new_stream(sink, table.schema, options=options) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+    except Exception as e:
+        logger.warning(f"Could not serialize dataset to Arrow, falling back to CSV: {str(e)}")
+        return None
+
+def _read_arrow_ipc(data: bytes) -> pd.DataFrame:
+    """Deserialize an Arrow IPC stream into a DataFrame"""
+    return pa.ipc.open_stream(data).read_all().to_pandas()
+
+def _to_csv_blob(df: pd.DataFrame) -> bytes:
+    """Serialize a DataFrame to zstd-compressed CSV bytes"""
+    return zstd.ZstdCompressor(level=3, threads=-1).compress(df.to_csv(index=False).encode('utf-8'))
+
+def _read_csv_blob(data: bytes) -> pd.DataFrame:
+    """Deserialize zstd-compressed CSV bytes into a DataFrame"""
+    return pd.read_csv(io.BytesIO(zstd.ZstdDecompressor().decompress(data)))
+
+# pandas' default missing-value tokens, so both CSV readers agree on nulls
+CSV_NULL_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+]
+
+def _parse_upload(contents: bytes, file_ext: str) -> Tuple[pd.DataFrame, Optional[pa.Table]]:
+    """Parse an uploaded file, returning the DataFrame and the Arrow table when one was read directly"""
+    table = None
+    try:
+        if file_ext == 'csv':
+            try:
+                # Multithreaded Arrow reader; the table is kept for storage
+                read_options = pacsv.ReadOptions(use_threads=True, block_size=8 << 20)
+                table = pacsv.read_csv(
+                    io.BytesIO(contents),
+                    read_options=read_options,
+                    convert_options=pacsv.ConvertOptions(strings_can_be_null=True, null_values=CSV_NULL_VALUES)
+                )
+                if len(set(table.column_names)) != table.num_columns:
+                    # Duplicate headers: let pandas rename them (a, a.1) as before
+                    table = None
+                    df_pandas = pd.read_csv(io.BytesIO(contents))
+                else:
+                    # Arrow infers dates and times that pandas keeps as text (and BSON cannot
+                    # encode as datetime.date), so re-read those columns as strings
+                    temporal_types = {
+                        field.name: pa.string() for field in table.schema if pa.types.is_temporal(field.type)
+                    }
+                    if temporal_types:
+                        table = pacsv.read_csv(
+                            io.BytesIO(contents),
+                            read_options=read_options,
+                            convert_options=pacsv.ConvertOptions(
+                                strings_can_be_null=True, null_values=CSV_NULL_VALUES, column_types=temporal_types
+                            )
+                        )
+                    df_pandas = table.to_pandas()
+            except pa.ArrowInvalid as arrow_error:
+                # Arrow is stricter than pandas (e.g. ragged rows), so retry with pandas
+                logger.warning(f"Arrow CSV reader failed, retrying with pandas: {str(arrow_error)}")
+                df_pandas = pd.read_csv(io.BytesIO(contents))
+        elif file_ext in ['xlsx', 'xls']:
+            df_pandas = pd.read_excel(io.BytesIO(contents))
+        elif file_ext == 'json':
+            df_pandas = pd.read_json(io.BytesIO(contents))
+        else:
+            raise HTTPException(status_code=400, detail=f"Unsupported format: {file_ext}")
+    except HTTPException:
+        raise
+    except Exception as parse_error:
+        logger.error(f"File parsing error: {str(parse_error)}")
+        raise HTTPException(status_code=400, detail=f"Invalid {file_ext.upper()} format: {str(parse_error)}")
+    
+    return df_pandas, table
+
+def _parse_and_summarize(contents: bytes, file_ext: str) -> Tuple[pd.DataFrame, Dict[str, Any], bytes, str]:
+    """Parse an upload, summarize it and serialize it for storage (blocking, run off the event loop)
+    
+    Returns the compact frame, its summary, and the stored blob with its format.
+    """
+    df_parsed, table = _parse_upload(contents, file_ext)
+    
+    # Storage keeps the parsed types; only the summaries and the cache use the compact ones
+    blob, blob_format = _to_arrow_ipc(df_parsed, table), 'arrow'
+    if blob is None:
+        blob, blob_format = _to_csv_blob(df_parsed), 'csv.zst'
+    
+    df_pandas = spark_processor.optimize_dtypes(df_parsed)
+    summary_stats = spark_processor.get_basic_stats(df_pandas)
+    # Duplicates cannot change after upload, so count them once here
+    summary_stats['duplicate_count'] = int(df_pandas.duplicated().sum())
+    return df_pandas, summary_stats, blob, blob_format
+
+def _run_quality_checks(df: pd.DataFrame, cached_duplicate_count: Optional[int] = None,
+                        include_quartiles: bool = False) -> Dict[str, Any]:
+    """Run every quality check on a DataFrame (blocking, run off the event loop)"""
+    return {
+        'missing_values': quality_checker.check_missing_values(df),
+        'duplicates': quality_checker.check_duplicates(df, cached_duplicate_count),
+        'outliers': quality_checker.detect_outliers(df),
+        'data_types': quality_checker.check_data_types(df),
+        'statistics': quality_checker.get_statistics(df, include_quartiles)
+    }
+
 # Define Models
 class Dataset(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -74,6 +255,17 @@ class DriftReport(BaseModel):
     overall_drift_score: float
     test_results: Dict[str, Any]
 
+class DriftJob(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    reference_dataset_id: str
+    target_dataset_id: str
+    created_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    status: str = "running"
+    report: Optional[DriftReport] = None
+    error: Optional[str] = None
+
 # Routes
 @api_router.get("/")
 async def root():
@@ -113,26 +305,11 @@ async def upload_dataset(file: UploadFile = File(...)):
         if file_size == 0:
             raise HTTPException(status_code=400, detail="File is empty")
         
-        # Process file based on format
-        logger.info(f"Processing {file_ext.upper()} file with pandas...")
-        try:
-            if file_ext == 'csv':
-                df_pandas = pd.read_csv(io.BytesIO(contents))
-                # Store as CSV string
-                data_string = contents.decode('utf-8')
-            elif file_ext in ['xlsx', 'xls']:
-                df_pandas = pd.read_excel(io.BytesIO(contents))
-                # Convert to CSV string for storage
-                data_string = df_pandas.to_csv(index=False)
-            elif file_ext == 'json':
-                df_pandas = pd.read_json(io.BytesIO(contents))
-                # Convert to CSV string for storage
-                data_string = df_pandas.to_csv(index=False)
-            else:
-                raise HTTPException(status_code=400, detail=f"Unsupported format: {file_ext}")
-        except Exception as parse_error:
-            logger.error(f"File parsing error: {str(parse_error)}")
-            raise HTTPException(status_code=400, detail=f"Invalid {file_ext.upper()} format: {str(parse_error)}")
+        # Parse, summarize and serialize on a worker thread so the event loop stays free
+        logger.info(f"Processing {file_ext.upper()} file...")
+        df_pandas, summary_stats, blob, blob_format = await asyncio.to_thread(
+            _parse_and_summarize, contents, file_ext
+        )
         
         # Get basic statistics
         rows = len(df_pandas)
@@ -140,8 +317,8 @@ async def upload_dataset(file: UploadFile = File(...)):
         column_names = df_pandas.columns.tolist()
         logger.info(f"File processed: {rows} rows, {columns} columns")
         
-        # Get data summary
-        summary_stats = spark_processor.get_basic_stats(df_pandas)
+        # Sketches are only read by drift checks, so they stay out of the returned metadata
+        sketch = summary_stats.pop('sketch', None)
         
         # Create dataset object
         dataset = Dataset(
@@ -157,9 +334,18 @@ async def upload_dataset(file: UploadFile = File(...)):
         logger.info("Storing dataset in MongoDB...")
         doc = dataset.model_dump()
         doc['upload_date'] = doc['upload_date'].isoformat()
-        doc['csv_data'] = data_string  # Store as CSV string regardless of input format
+        if sketch is not None:
+            doc['data_summary']['sketch'] = sketch
+        
+        # Store the data in GridFS as an Arrow IPC stream, or as compressed CSV if Arrow cannot
+        # encode it, so the metadata document stays small and the 16MB BSON limit does not apply
+        doc['blob_id'] = await fs.upload_from_stream(
+            f"{dataset.id}.{blob_format}", blob, metadata={"dataset_id": dataset.id}
+        )
+        doc['blob_format'] = blob_format
         
         await db.datasets.insert_one(doc)
+        df_cache[dataset.id] = df_pandas
         logger.info(f"Dataset {file.filename} successfully uploaded with id: {dataset.id}")
         
         return dataset
@@ -172,7 +358,7 @@ async def upload_dataset(file: UploadFile = File(...)):
 @api_router.get("/datasets", response_model=List[Dataset])
 async def get_datasets():
     """Get all uploaded datasets"""
-    datasets = await db.datasets.find({}, {"_id": 0, "csv_data": 0}).to_list(1000)
+    datasets = await db.datasets.find({}, DATA_FIELDS_PROJECTION).to_list(1000)
     
     for dataset in datasets:
         if isinstance(dataset['upload_date'], str):
@@ -181,34 +367,24 @@ async def get_datasets():
     return datasets
 
 @api_router.post("/quality-check/{dataset_id}", response_model=QualityReport)
-async def run_quality_check(dataset_id: str):
-    """Run quality analysis on a dataset"""
+async def run_quality_check(dataset_id: str, include_quartiles: bool = False):
+    """Run quality analysis on a dataset, optionally adding quartiles to the numeric summary"""
     try:
         # Get dataset from MongoDB
-        dataset_doc = await db.datasets.find_one({"id": dataset_id}, {"_id": 0})
-        if not dataset_doc:
+        df = await _load_df(dataset_id)
+        if df is None:
             raise HTTPException(status_code=404, detail="Dataset not found")
         
-        # Load CSV data
-        csv_data = dataset_doc.get('csv_data')
-        df = pd.read_csv(io.StringIO(csv_data))
-        
         # Run quality checks
-        missing_values = quality_checker.check_missing_values(df)
-        duplicates = quality_checker.check_duplicates(df)
-        outliers = quality_checker.detect_outliers(df)
-        data_types = quality_checker.check_data_types(df)
-        statistics = quality_checker.get_statistics(df)
+        quality_results = await asyncio.to_thread(
+            _run_quality_checks,
+            df,
+            await _load_summary_field(dataset_id, 'duplicate_count'),
+            include_quartiles
+        )
         
         # Create quality report
-        report = QualityReport(
-            dataset_id=dataset_id,
-            missing_values=missing_values,
-            duplicates=duplicates,
-            outliers=outliers,
-            data_types=data_types,
-            statistics=statistics
-        )
+        report = QualityReport(dataset_id=dataset_id, **quality_results)
         
         # Store in MongoDB
         doc = report.model_dump()
@@ -220,47 +396,101 @@ async def run_quality_check(dataset_id: str):
         logging.error(f"Error in quality check: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error in quality check: {str(e)}")
 
+async def _run_drift(reference_id: str, target_id: str, n_permutations: int = 0) -> DriftReport:
+    """Run drift detection between two datasets and store the report"""
+    # Get reference dataset
+    ref_df = await _load_df(reference_id)
+    if ref_df is None:
+        raise HTTPException(status_code=404, detail="Reference dataset not found")
+    
+    # Get target dataset
+    target_df = await _load_df(target_id)
+    if target_df is None:
+        raise HTTPException(status_code=404, detail="Target dataset not found")
+    
+    # Run drift detection
+    drift_results = await asyncio.to_thread(
+        drift_detector.detect_drift,
+        ref_df,
+        target_df,
+        await _load_summary_field(reference_id, 'sketch'),
+        await _load_summary_field(target_id, 'sketch'),
+        n_permutations
+    )
+    
+    # Create drift report
+    report = DriftReport(
+        reference_dataset_id=reference_id,
+        target_dataset_id=target_id,
+        drift_detected=drift_results['drift_detected'],
+        column_drift=drift_results['column_drift'],
+        overall_drift_score=drift_results['overall_drift_score'],
+        test_results=drift_results['test_results']
+    )
+    
+    # Store in MongoDB
+    doc = report.model_dump()
+    doc['report_date'] = doc['report_date'].isoformat()
+    await db.drift_reports.insert_one(doc)
+    
+    return report
+
+async def _run_drift_job(job_id: str, reference_id: str, target_id: str, n_permutations: int = 0):
+    """Run a drift check in the background and record its outcome on the job"""
+    try:
+        report = await _run_drift(reference_id, target_id, n_permutations)
+        report_doc = report.model_dump()
+        report_doc['report_date'] = report_doc['report_date'].isoformat()
+        update = {"status": "completed", "report": report_doc}
+    except Exception as e:
+        logging.error(f"Error in drift job {job_id}: {str(e)}")
+        error = e.detail if isinstance(e, HTTPException) else str(e)
+        update = {"status": "failed", "error": error}
+    
+    await db.drift_jobs.update_one({"id": job_id}, {"$set": update})
+
 @api_router.post("/drift-check", response_model=DriftReport)
-async def run_drift_check(reference_id: str, target_id: str):
-    """Run drift detection between two datasets"""
+async def run_drift_check(reference_id: str, target_id: str, n_permutations: int = Query(0, ge=0, le=10_000)):
+    """Run drift detection between two datasets, optionally with permutation-test p-values"""
     try:
-        # Get reference dataset
-        ref_doc = await db.datasets.find_one({"id": reference_id}, {"_id": 0})
-        if not ref_doc:
-            raise HTTPException(status_code=404, detail="Reference dataset not found")
-        
-        # Get target dataset
-        target_doc = await db.datasets.find_one({"id": target_id}, {"_id": 0})
-        if not target_doc:
-            raise HTTPException(status_code=404, detail="Target dataset not found")
-        
-        # Load CSV data
-        ref_df = pd.read_csv(io.StringIO(ref_doc.get('csv_data')))
-        target_df = pd.read_csv(io.StringIO(target_doc.get('csv_data')))
-        
-        # Run drift detection
-        drift_results = drift_detector.detect_drift(ref_df, target_df)
-        
-        # Create drift report
-        report = DriftReport(
-            reference_dataset_id=reference_id,
-            target_dataset_id=target_id,
-            drift_detected=drift_results['drift_detected'],
-            column_drift=drift_results['column_drift'],
-            overall_drift_score=drift_results['overall_drift_score'],
-            test_results=drift_results['test_results']
-        )
-        
-        # Store in MongoDB
-        doc = report.model_dump()
-        doc['report_date'] = doc['report_date'].isoformat()
-        await db.drift_reports.insert_one(doc)
-        
-        return report
+        return await _run_drift(reference_id, target_id, n_permutations)
     except Exception as e:
         logging.error(f"Error in drift check: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Error in drift check: {str(e)}")
 
+@api_router.post("/drift-jobs", response_model=DriftJob)
+async def create_drift_job(reference_id: str, target_id: str, background_tasks: BackgroundTasks,
+                           n_permutations: int = Query(0, ge=0, le=10_000)):
+    """Start drift detection in the background and return a job to poll"""
+    for dataset_id, label in ((reference_id, "Reference"), (target_id, "Target")):
+        if not await db.datasets.find_one({"id": dataset_id}, {"_id": 0, "id": 1}):
+            raise HTTPException(status_code=404, detail=f"{label} dataset not found")
+    
+    job = DriftJob(reference_dataset_id=reference_id, target_dataset_id=target_id)
+    
+    # Store in MongoDB
+    doc = job.model_dump()
+    doc['created_date'] = doc['created_date'].isoformat()
+    await db.drift_jobs.insert_one(doc)
+    
+    background_tasks.add_task(_run_drift_job, job.id, reference_id, target_id, n_permutations)
+    
+    return job
+
+@api_router.get("/drift-jobs/{job_id}", response_model=DriftJob)
+async def get_drift_job(job_id: str):
+    """Get the status of a drift job, with its report once completed"""
+    job = await db.drift_jobs.find_one({"id": job_id}, {"_id": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Drift job not found")
+    
+    if isinstance(job['created_date'], str):
+        job['created_date'] = datetime.fromisoformat(job['created_date'])
+    if job.get('report') and isinstance(job['report']['report_date'], str):
+        job['report']['report_date'] = datetime.fromisoformat(job['report']['report_date'])
+    
+    return job
+
 @api_router.get("/quality-reports/{dataset_id}", response_model=List[QualityReport])
 async def get_quality_reports(dataset_id: str):
     """Get all quality reports for a dataset"""
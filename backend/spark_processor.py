@@ -1,6 +1,8 @@
 import pandas as pd
+import numpy as np
 from typing import Dict, Any
 import logging
+from _kernels import value_counts
 
 logger = logging.getLogger(__name__)
 
@@ -28,18 +30,73 @@ class SparkDataProcessor:
             stats['column_types'] = {col: str(dtype) for col, dtype in df.dtypes.items()}
             
             # Get numeric columns
-            numeric_cols = df.select_dtypes(include=['int64', 'float64']).columns.tolist()
+            numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
             
             if numeric_cols:
                 # Get summary statistics for numeric columns
-                summary = df[numeric_cols].describe()
+                summary = df[numeric_cols].agg(['count', 'mean', 'std', 'min', 'max'])
                 stats['numeric_summary'] = summary.to_dict()
             
+            # Get compact per-column sketches used to fast-path drift checks
+            stats['sketch'] = self.get_column_sketches(df)
+            
             return stats
         except Exception as e:
             logger.error(f"Error getting basic stats: {str(e)}")
             return {}
     
+    def get_column_sketches(self, df: pd.DataFrame, n_quantiles: int = 65, top_k: int = 32) -> Dict[str, Any]:
+        """Get a quantile grid for numeric columns and top-k value counts for the rest"""
+        try:
+            sketches = {}
+            
+            # Quantile grid for all numeric columns in one call
+            numeric_df = df.select_dtypes(include=[np.number])
+            data = numeric_df.to_numpy(dtype=np.float64, na_value=np.nan)
+            valid_counts = np.sum(~np.isnan(data), axis=0)
+            has_values = valid_counts > 0
+            if has_values.any():
+                quantiles = np.nanquantile(data[:, has_values], np.linspace(0, 1, n_quantiles), axis=0)
+                for col, count, q in zip(numeric_df.columns[has_values], valid_counts[has_values], quantiles.T):
+                    sketches[col] = {'n': int(count), 'q': q.tolist()}
+            
+            # Most frequent values for the remaining columns
+            for col in df.columns.difference(numeric_df.columns, sort=False):
+                counts = value_counts(df[col])
+                counts = counts[counts > 0]
+                if len(counts) > 0:
+                    sketches[col] = {
+                        'n': int(counts.sum()),
+                        'topk': {str(value): int(count) for value, count in counts.head(top_k).items()}
+                    }
+            
+            return sketches
+        except Exception as e:
+            logger.error(f"Error getting column sketches: {str(e)}")
+            return {}
+    
+    def optimize_dtypes(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Downcast numeric columns and convert low-cardinality text columns to categoricals"""
+        try:
+            df = df.copy(deep=False)
+            
+            # Smallest integer type that holds the values; float32 where it stays within tolerance
+            for col in df.select_dtypes(include='integer').columns:
+                df[col] = pd.to_numeric(df[col], downcast='integer')
+            for col in df.select_dtypes(include='float').columns:
+                df[col] = pd.to_numeric(df[col], downcast='float')
+            
+            # Repeated strings are stored once as categories and counted by integer code
+            if len(df) > 0:
+                for col in df.select_dtypes(include='object').columns:
+                    if df[col].nunique() / len(df) < 0.5:
+                        df[col] = df[col].astype('category')
+            
+            return df
+        except Exception as e:
+            logger.error(f"Error optimizing dtypes: {str(e)}")
+            return df
+    
     def clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """Basic data cleaning operations"""
         try:
@@ -0,0 +1,100 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from drift_detector import DriftDetector
+from spark_processor import SparkDataProcessor
+
+
+def _sketch(values):
+    return SparkDataProcessor().get_column_sketches(pd.DataFrame({'x': values}))['x']
+
+
+def test_sketch_skips_matching_distributions():
+    detector = DriftDetector()
+    values = np.random.default_rng(0).normal(size=2_000)
+
+    result = detector._sketch_test('x', _sketch(values), _sketch(values))
+
+    assert result is not None
+    assert result['has_drift'] is False
+    assert result['drift_score'] < result['critical_value']
+
+
+def test_sketch_does_not_skip_shift_behind_outlier():
+    detector = DriftDetector()
+    rng = np.random.default_rng(0)
+    reference = np.append(rng.normal(size=20_000), 1e4)
+    target = rng.normal(loc=1.0, size=20_000)
+
+    assert detector._sketch_test('x', _sketch(reference), _sketch(target)) is None
+
+    report = detector.detect_drift(
+        pd.DataFrame({'x': reference}), pd.DataFrame({'x': target}),
+        reference_sketch={'x': _sketch(reference)}, target_sketch={'x': _sketch(target)}
+    )
+    assert report['column_drift']['x']['test_type'] == 'KS Test'
+    assert report['column_drift']['x']['has_drift'] is True
+
+
+def test_chi_square_handles_values_missing_from_reference():
+    detector = DriftDetector()
+    reference = pd.DataFrame({'c': ['a'] * 500 + ['b'] * 500})
+    target = pd.DataFrame({'c': ['a'] * 495 + ['b'] * 500 + ['new'] * 5})
+
+    result = detector._chi_square_test(reference, target, 'c')
+
+    assert result['test_type'] == 'Chi-Square Test'
+    assert result['drift_score'] < 10
+    assert 0 < result['p_value'] < 1
+    assert result['target_unique_values'] == 3
+
+
+def test_chi_square_single_category_has_no_drift():
+    detector = DriftDetector()
+    frame = pd.DataFrame({'c': ['a'] * 10})
+
+    result = detector._chi_square_test(frame, frame, 'c')
+
+    assert result['has_drift'] is False
+    assert result['p_value'] == 1.0
+
+
+def test_sharded_ks_tracks_full_ks():
+    rng = np.random.default_rng(0)
+    reference = pd.DataFrame({'same': rng.normal(size=40_000), 'shifted': rng.normal(size=40_000)})
+    target = pd.DataFrame({'same': rng.normal(size=30_000), 'shifted': rng.normal(loc=0.3, size=30_000)})
+
+    sharded = DriftDetector(max_samples=4_000, n_batches=5)._ks_test(reference, target, reference.columns)
+    full = DriftDetector()._ks_test(reference, target, reference.columns)
+
+    for column in reference.columns:
+        assert 'drift_score_std' in sharded[column]
+        assert 'drift_score_std' not in full[column]
+        assert sharded[column]['drift_score'] == pytest.approx(full[column]['drift_score'], abs=0.02)
+        assert sharded[column]['has_drift'] == full[column]['has_drift']
+    assert full['shifted']['has_drift'] and not full['same']['has_drift']
+
+
+@pytest.mark.parametrize('shift', [0.0, 0.15, 1.0])
+def test_permutation_pvalue_tracks_ks_2samp(shift):
+    rng = np.random.default_rng(0)
+    reference = rng.normal(size=400)
+    target = rng.normal(loc=shift, size=300)
+    n_perm = 2_000
+
+    p_value = DriftDetector()._ks_permutation_pvalue(reference, target, n_perm, rng=np.random.default_rng(1))
+
+    assert 1 / (n_perm + 1) <= p_value <= 1
+    assert p_value == pytest.approx(stats.ks_2samp(reference, target).pvalue, abs=0.05)
+
+
+def test_detect_drift_reports_permutation_pvalues():
+    rng = np.random.default_rng(0)
+    reference = pd.DataFrame({'x': rng.normal(size=500)})
+    target = pd.DataFrame({'x': rng.normal(size=500)})
+
+    report = DriftDetector().detect_drift(reference, target, n_permutations=200)
+
+    assert 0 < report['column_drift']['x']['permutation_p_value'] <= 1
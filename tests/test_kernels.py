@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from _kernels import mean_std_min_max, psi_kernel, value_counts
+
+
+def _psi_baseline(ref, tgt, lo, hi, bins):
+    # Equal-width bins over [lo, hi]; values outside fall into the outer bins
+    edges = np.linspace(lo, hi, bins + 1)
+    ref_pct = np.histogram(np.clip(ref, lo, hi), bins=edges)[0] / ref.size + 0.0001
+    tgt_pct = np.histogram(np.clip(tgt, lo, hi), bins=edges)[0] / tgt.size + 0.0001
+    return np.sum((tgt_pct - ref_pct) * np.log(tgt_pct / ref_pct))
+
+
+@pytest.mark.parametrize('shift', [0.0, 0.5, 3.0])
+def test_psi_kernel_matches_histogram_baseline(shift):
+    rng = np.random.default_rng(0)
+    ref = rng.normal(size=5_000)
+    tgt = rng.normal(loc=shift, size=3_000)
+
+    expected = _psi_baseline(ref, tgt, ref.min(), ref.max(), 10)
+
+    assert psi_kernel(ref, tgt, ref.min(), ref.max(), 10) == pytest.approx(expected, rel=1e-9)
+
+
+def test_psi_kernel_constant_reference():
+    ref = np.zeros(100)
+    tgt = np.array([-1.0, 0.0, 1.0, 2.0])
+
+    # Values below the constant fall in the first bin, the rest in the last
+    ref_pct = np.array([0.0] * 9 + [1.0]) + 0.0001
+    tgt_pct = np.array([0.25] + [0.0] * 8 + [0.75]) + 0.0001
+    expected = np.sum((tgt_pct - ref_pct) * np.log(tgt_pct / ref_pct))
+
+    assert psi_kernel(ref, tgt, 0.0, 0.0, 10) == pytest.approx(expected)
+
+
+def test_mean_std_min_max_matches_pandas():
+    values = np.random.default_rng(0).lognormal(mean=3.0, size=10_001)
+    series = pd.Series(values)
+
+    mean, std, lo, hi = mean_std_min_max(values)
+
+    assert mean == pytest.approx(series.mean(), rel=1e-12)
+    assert std == pytest.approx(series.std(), rel=1e-9)
+    assert lo == series.min()
+    assert hi == series.max()
+
+
+def test_mean_std_min_max_single_value_has_nan_std():
+    mean, std, lo, hi = mean_std_min_max(np.array([4.0]))
+
+    assert (mean, lo, hi) == (4.0, 4.0, 4.0)
+    assert np.isnan(std)
+
+
+def test_value_counts_matches_pandas_with_nulls_and_ties():
+    series = pd.Series(['b', None, 'a', 'c', 'a', np.nan, 'b', 'd', 'c', 'c'], dtype=object, name='city')
+
+    result = value_counts(series)
+
+    # Ties keep first-occurrence order and nulls are dropped, as in pandas
+    pd.testing.assert_series_equal(result, series.value_counts(), check_index_type=False)
+    assert result.index.tolist() == ['c', 'b', 'a', 'd']
+
+
+def test_value_counts_falls_back_to_pandas_for_mixed_types():
+    series = pd.Series([1, 'a', 1, None, 2.5, 'a', 1], dtype=object)
+
+    pd.testing.assert_series_equal(value_counts(series), series.value_counts())
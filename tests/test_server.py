@@ -0,0 +1,199 @@
+import asyncio
+import io
+
+import bson
+import httpx
+import numpy as np
+import pandas as pd
+import pytest
+from cachetools import LRUCache
+
+import server
+
+
+def test_parse_upload_reads_null_tokens_in_string_columns():
+    contents = b"name,score\nalice,1\n,2\nNA,3\nN/A,\nnull,5\nbob,6\n"
+
+    df, table = server._parse_upload(contents, 'csv')
+
+    assert table is not None
+    assert df['name'].isna().tolist() == [False, True, True, True, True, False]
+    assert df['score'].isna().sum() == 1
+    pd.testing.assert_frame_equal(df, pd.read_csv(io.BytesIO(contents)), check_dtype=False)
+
+
+def test_parse_upload_renames_duplicate_headers_like_pandas():
+    contents = b"a,a,b\n1,2,3\n4,5,6\n"
+
+    df, table = server._parse_upload(contents, 'csv')
+
+    assert table is None
+    assert list(df.columns) == ['a', 'a.1', 'b']
+    assert df['a.1'].tolist() == [2, 5]
+
+
+def test_parse_upload_keeps_dates_as_text_so_quality_reports_encode():
+    contents = b"day,at,value\n2024-01-01,2024-01-01T10:00:00,1.5\n2024-01-02,2024-01-02 11:30,2.5\n2024-01-01,,3.5\n"
+
+    df, table = server._parse_upload(contents, 'csv')
+
+    assert table is not None
+    assert df['day'].tolist() == ['2024-01-01', '2024-01-02', '2024-01-01']
+    assert df['at'].tolist()[:2] == ['2024-01-01T10:00:00', '2024-01-02 11:30']
+    assert df['at'].isna().tolist() == [False, False, True]
+
+    df = server.spark_processor.optimize_dtypes(df)
+    report = server.QualityReport(dataset_id='dates', **server._run_quality_checks(df))
+    doc = report.model_dump()
+    doc['report_date'] = doc['report_date'].isoformat()
+    bson.encode(doc)
+
+
+@pytest.mark.parametrize('file_ext', ['json', 'csv'])
+def test_parse_and_summarize_stores_parsed_types(file_ext):
+    frame = pd.DataFrame({'price': [1234.5678, 2.25, 3.0, 1234.5678], 'city': ['a', 'b', 'a', 'a']})
+    contents = (frame.to_json() if file_ext == 'json' else frame.to_csv(index=False)).encode()
+
+    df, summary, blob, blob_format = server._parse_and_summarize(contents, file_ext)
+
+    assert blob_format == 'arrow'
+    stored = server._read_arrow_ipc(blob)
+    assert stored['price'].dtype == 'float64'
+    assert stored['price'].tolist() == frame['price'].tolist()
+    assert df['price'].dtype == 'float32'
+    assert summary['duplicate_count'] == 1
+
+
+def test_upload_summary_matches_loaded_frame():
+    rng = np.random.default_rng(0)
+    frame = pd.DataFrame({
+        'amount': rng.normal(100, 15, size=500).round(3),
+        'count': rng.integers(0, 5, size=500),
+        'city': rng.choice(['a', 'b', 'c'], size=500)
+    })
+    contents = frame.to_json(orient='records').encode()
+
+    df, summary, blob, blob_format = server._parse_and_summarize(contents, 'json')
+    loaded = server.spark_processor.optimize_dtypes(server._read_arrow_ipc(blob))
+
+    pd.testing.assert_frame_equal(loaded, df)
+    assert summary['duplicate_count'] == int(loaded.duplicated().sum()) > 0
+    assert summary['sketch'] == server.spark_processor.get_column_sketches(loaded)
+
+
+def test_drift_endpoints_reject_out_of_range_permutations():
+    async def post(path):
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            return await client.post(path, params={'reference_id': 'a', 'target_id': 'b', 'n_permutations': 10_001})
+
+    for path in ('/api/drift-check', '/api/drift-jobs'):
+        assert asyncio.run(post(path)).status_code == 422
+
+
+def test_drift_job_moves_from_running_to_completed_or_failed(monkeypatch):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+
+    async def run():
+        db = mongomock_motor.AsyncMongoMockClient()['test_database']
+        monkeypatch.setattr(server, 'db', db)
+        monkeypatch.setattr(server, 'df_cache', LRUCache(maxsize=16))
+        await db.datasets.insert_many([
+            {'id': 'ref', 'csv_data': 'x,c\n1,a\n2,b\n3,a\n4,b\n'},
+            {'id': 'target', 'csv_data': 'x,c\n1,a\n2,b\n3,a\n5,b\n'},
+            {'id': 'broken', 'csv_data': ''}
+        ])
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            statuses = {}
+            for target_id in ('target', 'broken'):
+                response = await client.post('/api/drift-jobs', params={'reference_id': 'ref', 'target_id': target_id})
+                assert response.status_code == 200
+                job = response.json()
+                assert job['status'] == 'running'
+
+                # The ASGI transport returns once the background task has finished
+                response = await client.get(f"/api/drift-jobs/{job['id']}")
+                assert response.status_code == 200
+                statuses[target_id] = response.json()
+
+            missing = await client.post('/api/drift-jobs', params={'reference_id': 'ref', 'target_id': 'nope'})
+            assert missing.status_code == 404
+        return statuses
+
+    statuses = asyncio.run(run())
+
+    assert statuses['target']['status'] == 'completed'
+    assert set(statuses['target']['report']['column_drift']) == {'x', 'c'}
+    assert statuses['broken']['status'] == 'failed'
+    assert statuses['broken']['report'] is None
+    assert statuses['broken']['error']
+
+
+def _mock_storage(monkeypatch, mongomock_motor):
+    """Point the server at an in-memory database and GridFS bucket; call inside the event loop"""
+    db = mongomock_motor.AsyncMongoMockClient()['test_database']
+    monkeypatch.setattr(server, 'db', db)
+    monkeypatch.setattr(server, 'fs', server.AsyncIOMotorGridFSBucket(db))
+    monkeypatch.setattr(server, 'df_cache', LRUCache(maxsize=16))
+    return db
+
+
+def test_sketches_stay_out_of_dataset_metadata(monkeypatch):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+
+    async def run():
+        db = _mock_storage(monkeypatch, mongomock_motor)
+        await db.datasets.insert_one({
+            'id': 'legacy', 'filename': 'legacy.csv', 'upload_date': '2024-01-01T00:00:00+00:00',
+            'rows': 1, 'columns': 1, 'column_names': ['x'], 'file_size': 4,
+            'data_summary': {'duplicate_count': 0, 'sketch': {'x': {'n': 1, 'q': [1.0, 1.0]}}},
+            'csv_data': 'x\n1\n'
+        })
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            uploaded = await client.post('/api/upload', files={'file': ('data.csv', b'x,c\n1,a\n2,b\n2,b\n')})
+            listed = await client.get('/api/datasets')
+
+        dataset_id = uploaded.json()['id']
+        return uploaded.json(), listed.json(), await server._load_summary_field(dataset_id, 'sketch')
+
+    with mongomock_motor.enabled_gridfs_integration():
+        uploaded, listed, stored_sketch = asyncio.run(run())
+
+    assert 'sketch' not in uploaded['data_summary']
+    assert uploaded['data_summary']['duplicate_count'] == 1
+    assert len(listed) == 2
+    assert all('sketch' not in dataset['data_summary'] for dataset in listed)
+    assert set(stored_sketch) == {'x', 'c'}
+
+
+@pytest.mark.parametrize('blob_format', ['arrow', 'csv.zst'])
+def test_upload_round_trips_through_gridfs(monkeypatch, blob_format):
+    mongomock_motor = pytest.importorskip('mongomock_motor')
+    if blob_format == 'csv.zst':
+        # Datasets Arrow cannot encode fall back to compressed CSV
+        monkeypatch.setattr(server, '_to_arrow_ipc', lambda df, table=None: None)
+    contents = b"amount,city,day\n1.25,a,2024-01-01\n2.5,b,2024-01-02\n,a,\n2.5,b,2024-01-02\n"
+
+    async def run():
+        db = _mock_storage(monkeypatch, mongomock_motor)
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url='http://test') as client:
+            response = await client.post('/api/upload', files={'file': ('data.csv', contents)})
+        dataset_id = response.json()['id']
+        uploaded = server.df_cache.pop(dataset_id)
+
+        doc = await db.datasets.find_one({'id': dataset_id})
+        stored_files = await db['fs.files'].count_documents({'metadata.dataset_id': dataset_id})
+        return doc, stored_files, uploaded, await server._load_df(dataset_id)
+
+    with mongomock_motor.enabled_gridfs_integration():
+        doc, stored_files, uploaded, loaded = asyncio.run(run())
+
+    assert doc['blob_format'] == blob_format
+    assert stored_files == 1
+    assert not any(field in doc for field in server.EMBEDDED_DATA_FIELDS)
+    pd.testing.assert_frame_equal(loaded, uploaded)
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+
+from spark_processor import SparkDataProcessor
+
+
+def test_optimize_dtypes_downcasts_numeric_columns():
+    df = pd.DataFrame({
+        'small': np.array([1, 2, 3, 4], dtype=np.int64),
+        'wide': np.array([1, 300, -5, 7], dtype=np.int64),
+        'ratio': np.array([0.5, 1.25, 2.0, np.nan], dtype=np.float64)
+    })
+
+    optimized = SparkDataProcessor().optimize_dtypes(df)
+
+    assert optimized['small'].dtype == np.int8
+    assert optimized['wide'].dtype == np.int16
+    assert optimized['ratio'].dtype == np.float32
+    pd.testing.assert_frame_equal(optimized, df, check_dtype=False)
+    assert df['small'].dtype == np.int64
+
+
+def test_optimize_dtypes_categorizes_only_repeated_strings():
+    df = pd.DataFrame({
+        'repeated': ['a', 'b'] * 5,
+        'half_unique': ['a', 'b', 'c', 'd', 'e'] * 2,
+        'mostly_unique': ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'a', 'b', 'c']
+    }, dtype=object)
+
+    optimized = SparkDataProcessor().optimize_dtypes(df)
+
+    # Categories only when fewer than half of the values are unique
+    assert isinstance(optimized['repeated'].dtype, pd.CategoricalDtype)
+    assert not isinstance(optimized['half_unique'].dtype, pd.CategoricalDtype)
+    assert not isinstance(optimized['mostly_unique'].dtype, pd.CategoricalDtype)
+    assert optimized['repeated'].astype(object).tolist() == df['repeated'].tolist()
+
+
+def test_optimize_dtypes_empty_frame():
+    df = pd.DataFrame({'x': pd.Series([], dtype=np.int64), 'name': pd.Series([], dtype=object)})
+
+    optimized = SparkDataProcessor().optimize_dtypes(df)
+
+    assert list(optimized.columns) == ['x', 'name']
+    assert len(optimized) == 0
+    assert not isinstance(optimized['name'].dtype, pd.CategoricalDtype)